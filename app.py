@@ -4,21 +4,30 @@
   #使用 python -m streamlit 執行您的 app.py 檔案
   #(ai-recipe) G:\...\iChef> python -m streamlit run app.py
 
+import io
 import os
 import sys
-from typing import List
+import json
+import asyncio
+import hashlib
+import functools
+import threading
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 
 # Streamlit UI 函式庫
 import streamlit as st
-from PIL import Image
+from PIL import Image, ImageOps
 
 # Google AI SDK
 try:
+    import httpx
+    import diskcache
     from google import genai
+    from google.genai import types
     from dotenv import load_dotenv
 except ImportError:
-    st.error("❌ 缺少必要的函式庫。請運行: pip install google-genai python-dotenv streamlit pillow")
+    st.error("❌ 缺少必要的函式庫。請運行: pip install google-genai httpx diskcache python-dotenv streamlit pillow")
     st.stop()
 
 # =================================================================
@@ -34,27 +43,99 @@ if not API_KEY:
     st.error("❌ 錯誤：GEMINI_API_KEY 未設定。請檢查您的 .env 檔案 (與 app.py 同目錄)。")
     st.stop()
 
+# 共用的 HTTP 連線池：所有非同步呼叫重複使用同一組 TCP/TLS 連線，避免每次重新握手
+HTTP_OPTIONS = types.HttpOptions(
+    async_client_args={
+        "limits": httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    }
+)
+
+@st.cache_resource
+def get_client() -> genai.Client:
+    """建立 Gemini 客戶端 (透過 client.aio 使用非同步介面)。
+
+    以 st.cache_resource 快取，整個行程只建立一次，所有 session 與重跑共用同一個連線池。
+    """
+    return genai.Client(api_key=API_KEY, http_options=HTTP_OPTIONS)
+
 try:
-    # 初始化 Gemini 客戶端
-    client = genai.Client(api_key=API_KEY)
+    # 啟動時先初始化一次，API Key 有誤時可立即提示
+    get_client()
 except Exception as e:
     st.error(f"❌ 初始化 Gemini 客戶端失敗，請檢查 API Key 是否有效。錯誤：{e}")
     st.stop()
 
+# 同時進行中的 Gemini 請求上限 (所有 session 共用)，避免超過 API 的 RPS 配額
+MAX_CONCURRENT_REQUESTS = 10
 
-# =================================================================
-# 2. AI 核心邏輯函式
-# =================================================================
+# 背景事件迴圈執行緒的名稱，用來在資源快取被清除後找回既有的迴圈
+EVENT_LOOP_THREAD_NAME = "ichef-event-loop"
 
-def create_recipe_prompt(ingredients: List[str], preference: str) -> str:
-    """根據食材清單和個人偏好，生成給 LLM 的提示詞。"""
-    ingredients_str = ", ".join(ingredients)
-    
-    # 使用 Markdown 格式強化 LLM 的輸出結構
-    prompt = f"""
+@st.cache_resource
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """在背景執行緒啟動一個常駐的事件迴圈，所有 session 的非同步請求都在此執行。
+
+    Streamlit 每個 session 各自在執行緒中重跑腳本，若各自 asyncio.run 會建立互不相干的事件迴圈，
+    共用的連線池與 Semaphore 也無法跨迴圈使用。
+
+    st.cache_resource 被清除時 (例如選單中的「Clear cache」) 此函式會再次執行；
+    此時沿用仍在運行的背景迴圈，而不是另開一個執行緒並遺留舊迴圈與其上進行中的請求。
+    """
+    for thread in threading.enumerate():
+        loop = getattr(thread, "event_loop", None)
+        if thread.name == EVENT_LOOP_THREAD_NAME and loop is not None and loop.is_running():
+            return loop
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name=EVENT_LOOP_THREAD_NAME, daemon=True)
+    thread.event_loop = loop
+    thread.start()
+    return loop
+
+@st.cache_resource
+def get_request_semaphore() -> asyncio.Semaphore:
+    """所有 session 共用的 Semaphore，限制同時送往 Gemini 的請求數。"""
+    return asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+@st.cache_resource
+def get_inflight_requests() -> Dict[str, asyncio.Future]:
+    """進行中的請求對照表 (快取 key -> Future)，讓相同請求只送出一次。"""
+    return {}
+
+def run_async(coro):
+    """將協程送到共用的事件迴圈執行，並阻塞等待結果 (供 Streamlit 的同步流程呼叫)。"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+async def _generate_content(**kwargs) -> types.GenerateContentResponse:
+    """所有非串流的 Gemini 呼叫都經過此處，受共用 Semaphore 限流。"""
+    async with get_request_semaphore():
+        return await get_client().aio.models.generate_content(**kwargs)
+
+async def _generate_content_stream(**kwargs) -> AsyncIterator[types.GenerateContentResponse]:
+    """串流版本：在整個串流期間佔用一個 Semaphore 名額。"""
+    async with get_request_semaphore():
+        async for chunk in await get_client().aio.models.generate_content_stream(**kwargs):
+            yield chunk
+
+# 模型與生成參數 (同時作為快取 key 的一部分)
+RECIPE_MODEL = "gemini-2.5-flash"
+RECIPE_TEMPERATURE = 0.7
+VISION_MODEL = "gemini-2.5-flash" # 使用支援多模態的 flash 模型
+VISION_TEMPERATURE = 0.3
+VISION_MAX_EDGE = 1024 # 食材辨識不需要原始解析度，長邊縮到此尺寸即可
+VISION_JPEG_QUALITY = 85
+PREVIEW_MAX_EDGE = 512 # 介面預覽圖的長邊尺寸
+VISION_PROMPT = sys.intern("請詳細辨識圖片中的所有食材，只列出食材名稱，以逗號分隔。請勿提供烹飪建議，只輸出食材清單。")
+
+# 食材清單為空時的提示訊息 (不會送出任何 AI 請求)
+_EMPTY_MSG = "🚨 你不乖!沒輸入!吃空氣去吧！"
+
+# 食譜提示詞模板只在載入時建立一次，每次呼叫只需代入食材與偏好
+# 使用 Markdown 格式強化 LLM 的輸出結構
+_RECIPE_TEMPLATE = """
     您是一位專業的食譜設計師和營養師。
     
-    請根據我提供的現有食材清單：**【{ingredients_str}】**，以及我的飲食偏好：**【{preference}】**，為我設計一個完整的食譜。
+    請根據我提供的現有食材清單：**【{ingredients}】**，以及我的飲食偏好：**【{preference}】**，為我設計一個完整的食譜。
 
     請使用 Markdown 格式，輸出一個清晰、結構化的食譜，包含以下欄位：
     # 食譜名稱 (創意且吸引人)
@@ -73,62 +154,312 @@ def create_recipe_prompt(ingredients: List[str], preference: str) -> str:
     
     請確保食譜內容健康且易於執行。
     """
-    return prompt
 
-@st.cache_data(show_spinner=False)
-def generate_recipe_from_ai(ingredients_text: str, preference_text: str) -> str:
-    """呼叫 LLM 進行食譜生成與客製化。"""
-    ingredients = [i.strip() for i in ingredients_text.split(',') if i.strip()]
-    
+# 持久化的 LLM 回應快取：重啟後仍有效，相同請求不再重複計費
+LLM_CACHE_DIR = Path(__file__).parent / '.llm_cache'
+
+@st.cache_resource
+def get_llm_cache() -> diskcache.Cache:
+    """開啟磁碟快取，以 st.cache_resource 快取，每次重跑不會重新開啟 SQLite 連線。"""
+    return diskcache.Cache(str(LLM_CACHE_DIR))
+
+# 記憶體快取 (st.cache_data) 的存活時間與容量上限，避免長時間運行時記憶體無限成長；
+# 過期或被淘汰的項目仍可由磁碟快取補上
+CACHE_TTL_SECONDS = 3600
+CACHE_MAX_ENTRIES = 256
+
+
+# =================================================================
+# 2. AI 核心邏輯函式
+# =================================================================
+
+def normalize_ingredients(ingredients_text: str) -> Tuple[str, ...]:
+    """將食材字串正規化 (去空白、小寫、去重、排序)，讓順序或大小寫不同的輸入共用快取。"""
+    return tuple(sorted({i.strip().lower() for i in ingredients_text.split(',') if i.strip()}))
+
+def hash_cache_key(payload: dict) -> str:
+    """將請求內容 (模型、提示詞、溫度等) 序列化後取 SHA-256，作為磁碟快取的 key。"""
+    key_payload = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(key_payload.encode("utf-8")).hexdigest()
+
+def is_cacheable(result: str) -> bool:
+    """只快取成功的回應，錯誤或空結果下次仍會重新呼叫。"""
+    return bool(result) and not result.startswith(("❌", "🚨"))
+
+def disk_cached(make_key: Callable[..., dict]):
+    """以請求內容的 SHA-256 為 key，將非同步 LLM 呼叫的結果存入磁碟快取。
+
+    查找順序：磁碟快取 -> 進行中的相同請求 -> 實際呼叫 API。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = hash_cache_key(make_key(*args, **kwargs))
+
+            # diskcache 是阻塞的 SQLite 存取，放到執行緒中避免卡住所有 session 共用的事件迴圈
+            cached = await asyncio.to_thread(get_llm_cache().get, key)
+            if cached is not None:
+                return cached
+
+            # 相同請求已在進行中 (例如多位使用者或連點按鈕)，直接等待它的結果
+            inflight = get_inflight_requests()
+            if key in inflight:
+                return await asyncio.shield(inflight[key])
+
+            future = asyncio.get_running_loop().create_future()
+            inflight[key] = future
+            try:
+                result = await func(*args, **kwargs)
+                if is_cacheable(result):
+                    await asyncio.to_thread(get_llm_cache().set, key, result)
+                future.set_result(result)
+                return result
+            except Exception as e:
+                # 發起的請求失敗時，等待中的呼叫收到相同的例外
+                future.set_exception(e)
+                future.exception() # 標記為已讀取，沒有等待者時也不會出現未處理例外的警告
+                raise
+            except BaseException:
+                # 發起的請求被取消時，等待中的呼叫也一併取消
+                future.cancel()
+                raise
+            finally:
+                inflight.pop(key, None)
+        return wrapper
+    return decorator
+
+def create_recipe_prompt(ingredients: Tuple[str, ...], preference: str) -> str:
+    """根據食材清單和個人偏好，生成給 LLM 的提示詞。"""
+    return _RECIPE_TEMPLATE.format_map({"ingredients": ", ".join(ingredients), "preference": preference})
+
+def _recipe_cache_key(prompt: str) -> dict:
+    return {"model": RECIPE_MODEL, "prompt": prompt, "temperature": RECIPE_TEMPERATURE}
+
+@disk_cached(_recipe_cache_key)
+async def _request_recipe_async(prompt: str) -> str:
+    """送出食譜提示詞並回傳 LLM 的完整回應。
+
+    失敗時直接拋出例外 (不回傳錯誤訊息)，避免暫時性的錯誤被 st.cache_data 快取。
+    """
+    response = await _generate_content(
+        model=RECIPE_MODEL,
+        contents=prompt,
+        config={"temperature": RECIPE_TEMPERATURE} 
+    )
+    return response.text
+
+async def generate_recipe_from_ingredients_async(ingredients: Tuple[str, ...], preference_text: str) -> str:
+    """以已正規化的食材清單呼叫 LLM 進行食譜生成與客製化。"""
     if not ingredients:
-        return "🚨 你不乖!沒輸入!吃空氣去吧！"
-    
+        return _EMPTY_MSG
+
+    return await _request_recipe_async(create_recipe_prompt(ingredients, preference_text))
+
+async def stream_recipe_from_ai_async(ingredients: Tuple[str, ...], preference_text: str) -> AsyncIterator[str]:
+    """以串流方式呼叫 LLM，收到片段就立即產出，完整內容於結束後寫入磁碟快取。"""
+    if not ingredients:
+        yield _EMPTY_MSG
+        return
+
     final_prompt = create_recipe_prompt(ingredients, preference_text)
-    model_name = "gemini-2.5-flash"
+    key = hash_cache_key(_recipe_cache_key(final_prompt))
+    cached = await asyncio.to_thread(get_llm_cache().get, key)
+    if cached is not None:
+        yield cached
+        return
+
+    # 相同請求已在進行中 (例如多位使用者同時生成相同食譜)，等待它完成後一次產出完整內容
+    inflight = get_inflight_requests()
+    if key in inflight:
+        shared = inflight[key]
+        try:
+            yield await asyncio.shield(shared)
+        except asyncio.CancelledError:
+            # 只有發起的串流被中途關閉時才轉成錯誤訊息；自己被取消則照常往外傳
+            if not shared.cancelled():
+                raise
+            yield "❌ 呼叫 AI 失敗。錯誤：相同的請求已被中斷，請重新生成。"
+        except Exception as e:
+            yield f"❌ 呼叫 AI 失敗。錯誤：{e}"
+        return
+
+    # 由第一個呼叫者負責串流，結束後以完整內容完成 Future，讓等待中的呼叫共用結果
+    future = asyncio.get_running_loop().create_future()
+    inflight[key] = future
+    chunks = []
 
     try:
-        response = client.models.generate_content(
-            model=model_name,
+        stream = _generate_content_stream(
+            model=RECIPE_MODEL,
             contents=final_prompt,
-            config={"temperature": 0.7} 
+            config={"temperature": RECIPE_TEMPERATURE}
         )
-        return response.text
-    
+        async for chunk in stream:
+            if chunk.text:
+                chunks.append(chunk.text)
+                yield chunk.text
+
+        result = "".join(chunks)
+        if is_cacheable(result):
+            await asyncio.to_thread(get_llm_cache().set, key, result)
+        future.set_result(result)
+
     except Exception as e:
-        return f"❌ 呼叫 AI 失敗。錯誤：{e}"
+        future.set_exception(e)
+        future.exception() # 標記為已讀取，沒有等待者時也不會出現未處理例外的警告
+        yield f"❌ 呼叫 AI 失敗。錯誤：{e}"
 
-# 移除 @st.cache_data 避免開發階段緩存錯誤
-def generate_ingredients_from_image(image: Image.Image) -> str:
-    """呼叫 Gemini Pro Vision API 辨識圖片中的食材。"""
-    
-    prompt = "請詳細辨識圖片中的所有食材，只列出食材名稱，以逗號分隔。請勿提供烹飪建議，只輸出食材清單。"
-    model_name = "gemini-2.5-flash" # 使用支援多模態的 flash 模型
+    finally:
+        # 串流被中途關閉 (例如使用者離開頁面) 時，等待中的呼叫也一併取消
+        if not future.done():
+            future.cancel()
+        inflight.pop(key, None)
 
-    # 確保圖片和文字提示都正確傳入
-    contents = [prompt, image]
+async def _anext(async_gen: AsyncIterator[str]) -> Optional[str]:
+    # 以 None 表示產生器已結束，避免 StopAsyncIteration 跨執行緒傳遞
+    try:
+        return await async_gen.__anext__()
+    except StopAsyncIteration:
+        return None
 
+def iterate_sync(async_gen: AsyncIterator[str]) -> Iterator[str]:
+    """將非同步產生器轉為同步產生器，供 st.write_stream 使用。"""
     try:
-        response = client.models.generate_content(
-            model=model_name,
-            contents=contents, 
-            config={"temperature": 0.3}
-        )
-        
-        ingredients_text = response.text.strip()
-        
-        if not ingredients_text or "無法辨識" in ingredients_text:
-            return ""
-        
-        return ingredients_text
+        while (chunk := run_async(_anext(async_gen))) is not None:
+            yield chunk
+    finally:
+        run_async(async_gen.aclose())
+
+async def generate_recipe_variants_async(ingredients: Tuple[str, ...], preference_text: str, count: int) -> List[str]:
+    """並行生成多個版本的食譜，網路等待時間重疊而非累加 (同時請求數由共用 Semaphore 限制)。"""
+
+    async def _generate_variant(index: int) -> str:
+        # 第一個版本沿用原始偏好，其餘版本要求不同的料理方式，避免產生重複的食譜
+        preference = preference_text
+        if index > 0:
+            preference = f"{preference_text}（第 {index + 1} 版：請採用與其他版本不同的料理方式）"
+        return await generate_recipe_from_ingredients_async(ingredients, preference)
+
+    return list(await asyncio.gather(*(_generate_variant(i) for i in range(count))))
+
+# 以正規化後的食材 tuple 作為快取參數，順序或大小寫不同的輸入也能命中
+@st.cache_data(show_spinner=False, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES)
+def generate_recipe_variants(ingredients: Tuple[str, ...], preference_text: str, count: int = 1) -> List[str]:
+    """同步包裝：在共用事件迴圈上並行送出所有版本的請求。"""
+    if not ingredients:
+        return [_EMPTY_MSG]
+    return run_async(generate_recipe_variants_async(ingredients, preference_text, count))
+
+def hash_image_bytes(image_bytes: bytes) -> bytes:
+    """以 BLAKE2b 雜湊上傳檔案的原始位元組，比讓快取層 pickle PIL 物件快得多且結果穩定。"""
+    return hashlib.blake2b(image_bytes, digest_size=16).digest()
+
+def prepare_image_for_vision(image_bytes: bytes) -> bytes:
+    """縮小並重新壓縮為 JPEG，大幅減少上傳到 Vision API 的資料量。"""
+    image = Image.open(io.BytesIO(image_bytes))
+    # 重新編碼會遺失 EXIF，先依方向資訊轉正，避免手機照片被旋轉
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((VISION_MAX_EDGE, VISION_MAX_EDGE), Image.Resampling.LANCZOS)
+
+    # 轉為 RGB 也順便處理 PNG 的透明通道
+    buf = io.BytesIO()
+    image.convert("RGB").save(buf, "JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+    return buf.getvalue()
+
+def make_preview_image(image_bytes: bytes) -> Image.Image:
+    """建立介面顯示用的縮圖 (保持比例)，只需在上傳時解碼一次。"""
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(image_bytes)))
+    image.thumbnail((PREVIEW_MAX_EDGE, PREVIEW_MAX_EDGE), Image.Resampling.LANCZOS)
+    return image
+
+def _vision_cache_key(image_bytes: bytes, mime: str) -> dict:
+    return {
+        "model": VISION_MODEL,
+        "prompt": VISION_PROMPT,
+        "image": hash_image_bytes(image_bytes).hex(),
+        "mime": mime,
+        "temperature": VISION_TEMPERATURE,
+    }
+
+@disk_cached(_vision_cache_key)
+async def generate_ingredients_from_image_async(image_bytes: bytes, mime: str) -> str:
+    """以非同步方式呼叫 Gemini Vision API 辨識圖片中的食材。
+
+    失敗時直接拋出例外，由呼叫端轉為錯誤訊息，避免暫時性的錯誤被快取。
+    """
+
+    # 快取未命中時才解碼與壓縮圖片 (CPU 密集，放到執行緒中避免阻塞事件迴圈)
+    jpeg_bytes = await asyncio.to_thread(prepare_image_for_vision, image_bytes)
+    image_part = types.Part.from_bytes(data=jpeg_bytes, mime_type="image/jpeg")
+
+    # 確保圖片和文字提示都正確傳入
+    contents = [VISION_PROMPT, image_part]
+
+    response = await _generate_content(
+        model=VISION_MODEL,
+        contents=contents, 
+        config={"temperature": VISION_TEMPERATURE}
+    )
     
-    except Exception as e:
-        # 將錯誤詳細印出到 Streamlit 介面
-        return f"❌ 圖片辨識失敗：請檢查 API 權限或圖片格式。詳細錯誤：{e}"
+    ingredients_text = response.text.strip()
+    
+    if not ingredients_text or "無法辨識" in ingredients_text:
+        return ""
+    
+    return ingredients_text
+
+# 以原始位元組作為參數，快取 key 只需雜湊檔案內容，不必處理 PIL 物件
+@st.cache_data(
+    hash_funcs={bytes: hash_image_bytes},
+    show_spinner=False,
+    ttl=CACHE_TTL_SECONDS,
+    max_entries=CACHE_MAX_ENTRIES
+)
+def generate_ingredients_from_image(image_bytes: bytes, mime: str) -> str:
+    """同步包裝：內部在共用事件迴圈上執行非同步版本。"""
+    return run_async(generate_ingredients_from_image_async(image_bytes, mime))
 
 # =================================================================
 # 3. Streamlit 前端介面設計
 # =================================================================
 
+def _handle_upload():
+    """file_uploader 的 on_change 回呼：辨識新上傳的圖片並直接寫入食材清單。"""
+    uploaded_file = st.session_state.upload
+
+    if uploaded_file is None:
+        st.session_state.last_upload_hash = None
+        st.session_state.upload_status = None
+        st.session_state.upload_thumb = None
+        return
+
+    image_bytes = uploaded_file.getvalue()
+    # 以檔案內容而非檔名判斷是否為新圖片，同名但內容不同的檔案也會重新辨識
+    upload_hash = hash_image_bytes(image_bytes)
+    if st.session_state.get("last_upload_hash") == upload_hash:
+        return
+
+    try:
+        # 預覽縮圖只在上傳時產生一次，之後的重跑直接沿用，不必重新解碼圖片
+        st.session_state.upload_thumb = make_preview_image(image_bytes)
+        with st.spinner("iChef 正在辨識圖片中的食材..."):
+            identified_ingredients = generate_ingredients_from_image(image_bytes, uploaded_file.type)
+    except Exception as e:
+        # 圖片無法解碼或辨識失敗時，將錯誤詳細印出到 Streamlit 介面；
+        # 不記錄雜湊，重新上傳同一張圖片時會再試一次
+        st.session_state.last_upload_hash = None
+        st.session_state.upload_thumb = None
+        st.session_state.upload_status = ("error", f"❌ 圖片辨識失敗：請檢查 API 權限或圖片格式。詳細錯誤：{e}")
+        return
+
+    st.session_state.last_upload_hash = upload_hash
+    if identified_ingredients:
+        st.session_state.ingredients_text = identified_ingredients
+        st.session_state.upload_status = ("success", "圖片辨識完成！已自動帶入食材清單。")
+    else:
+        st.session_state.ingredients_text = ""
+        st.session_state.upload_status = ("warning", "圖片中未辨識出明確食材，請嘗試手動輸入。")
+
 def main_app():
     st.set_page_config(page_title="iChef 食譜客製化工具", layout="wide")
     
@@ -140,46 +471,39 @@ def main_app():
     if "ingredients_text" not in st.session_state:
         st.session_state.ingredients_text = ""
     if "recipe_output" not in st.session_state:
-        st.session_state.recipe_output = ""
-    if "last_upload_name" not in st.session_state:
-        st.session_state.last_upload_name = None
+        st.session_state.recipe_output = []
+    if "last_upload_hash" not in st.session_state:
+        st.session_state.last_upload_hash = None
+    if "upload_status" not in st.session_state:
+        st.session_state.upload_status = None
+    if "upload_thumb" not in st.session_state:
+        st.session_state.upload_thumb = None
 
 
+    # 本次執行中按下生成按鈕時，暫存待處理的請求 (食材, 偏好, 版本數)
+    pending_request = None
+
     # ----- 圖片上傳區 -----
     col_img, col_input = st.columns([1, 2])
     
     with col_img:
         st.subheader("📸 圖片上傳")
-        uploaded_file = st.file_uploader("上傳冰箱/食材圖片", type=["jpg", "jpeg", "png"], accept_multiple_files=False)
+        # 圖片辨識在 on_change 回呼中完成，回呼會在本次執行前更新 session state，不需要再 st.rerun()
+        uploaded_file = st.file_uploader(
+            "上傳冰箱/食材圖片",
+            type=["jpg", "jpeg", "png"],
+            accept_multiple_files=False,
+            key="upload",
+            on_change=_handle_upload
+        )
         
-        # 處理圖片上傳
-        if uploaded_file is not None:
-            # 確保圖片只處理一次，或檔案名改變時才處理
-            if st.session_state.last_upload_name != uploaded_file.name:
-                
-                st.session_state.last_upload_name = uploaded_file.name # 立即更新檔案名
-                
-                image = Image.open(uploaded_file)
-                st.image(image, caption="您上傳的食材圖片", use_container_width=True)
-                
-                with st.spinner("iChef 正在辨識圖片中的食材..."):
-                    identified_ingredients = generate_ingredients_from_image(image)
-                    
-                    if identified_ingredients and not identified_ingredients.startswith("❌"):
-                        st.session_state.ingredients_text = identified_ingredients
-                        st.success(f"圖片辨識完成！已自動帶入食材清單。")
-                    elif identified_ingredients.startswith("❌"):
-                         st.error(identified_ingredients)
-                    else:
-                        st.warning("圖片中未辨識出明確食材，請嘗試手動輸入。")
-                        st.session_state.ingredients_text = ""
-                
-                # 關鍵修正：圖片處理完畢，執行重跑，讓 Text Area 顯示新的 session state 值
-                st.rerun() 
-            else:
-                # 圖片已上傳但沒有新的檔案，僅顯示圖片
-                image = Image.open(uploaded_file)
-                st.image(image, caption="您上傳的食材圖片", use_container_width=True)
+        # 顯示圖片與辨識結果
+        if uploaded_file is not None and st.session_state.upload_thumb is not None:
+            st.image(st.session_state.upload_thumb, caption="您上傳的食材圖片", use_container_width=True)
+
+            if st.session_state.upload_status:
+                level, message = st.session_state.upload_status
+                getattr(st, level)(message)
 
 
     # ----- 輸入與偏好設定區 -----
@@ -202,32 +526,65 @@ def main_app():
             placeholder="例如：低碳水、少油少鹽、無麩質、不使用烤箱，烹飪時間 20 分鐘內完成。",
             key="preference_text"
         )
+
+        # 食譜版本數：多個版本會並行送出請求，總等待時間約等於單次呼叫
+        variant_count = st.slider(
+            "3. 食譜版本數",
+            min_value=1,
+            max_value=3,
+            value=1,
+            key="variant_count",
+            help="一次生成多個不同做法的食譜版本，請求會同時送出。"
+        )
         
         # 讀取當前食材 (從 key="ingredients_text" 自動更新後的 state)
         current_ingredients = st.session_state.get('ingredients_text', '')
 
         # 處理按鈕點擊
         if st.button("✨ 生成客製化食譜 ✨", type="primary", use_container_width=True):
-            if not current_ingredients: 
+            # 食材只正規化一次，同時用於快取 key 與提示詞；輸入框仍保留使用者原本的文字
+            ingredients = normalize_ingredients(current_ingredients)
+
+            # 只有空白或逗號的輸入在此就擋下，不會進入任何非同步流程
+            if not ingredients: 
                 st.warning("不輸入就吃空氣去吧！")
                 return
-                
-            # 確保 AI 在運行時會顯示進度
-            with st.spinner("🔄 iChef 正在為您客製化食譜中，請稍候..."):
-                # 呼叫核心邏輯，使用從 st.session_state 讀取的值
-                recipe_result = generate_recipe_from_ai(current_ingredients, preference_input)
-                
-                # 將結果儲存在 session state 中以便顯示
-                st.session_state.recipe_output = recipe_result
+
+            # 實際的 AI 呼叫在下方輸出區執行，讓串流內容直接顯示在結果區
+            pending_request = (ingredients, preference_input.strip(), variant_count)
     
     # ----- 輸出結果區 (放在下方，讓介面更清晰) -----
-    if st.session_state.get("recipe_output"):
+    if pending_request or st.session_state.get("recipe_output"):
         st.markdown("<br><br>", unsafe_allow_html=True)
         st.markdown("---")
         st.header("✅ 客製化食譜結果")
-        
-        # 使用 st.markdown 渲染 LLM 輸出的 Markdown 格式
-        st.markdown(st.session_state.recipe_output)
+
+        if pending_request and pending_request[2] == 1:
+            # 單一版本：以串流方式逐段顯示，並同時累積完整內容存入 session state
+            ingredients, preference_text, _ = pending_request
+            recipe_result = st.write_stream(
+                iterate_sync(stream_recipe_from_ai_async(ingredients, preference_text))
+            )
+            st.session_state.recipe_output = [recipe_result]
+        else:
+            if pending_request:
+                # 多個版本：並行生成後一次顯示
+                with st.spinner("🔄 iChef 正在為您客製化食譜中，請稍候..."):
+                    try:
+                        st.session_state.recipe_output = generate_recipe_variants(*pending_request)
+                    except Exception as e:
+                        # 失敗的結果不會進入 st.cache_data，下次點擊會重新呼叫
+                        st.session_state.recipe_output = [f"❌ 呼叫 AI 失敗。錯誤：{e}"]
+
+            # 使用 st.markdown 渲染 LLM 輸出的 Markdown 格式；多個版本以分頁呈現
+            recipe_outputs = st.session_state.recipe_output
+            if len(recipe_outputs) == 1:
+                st.markdown(recipe_outputs[0])
+            else:
+                tabs = st.tabs([f"版本 {i + 1}" for i in range(len(recipe_outputs))])
+                for tab, recipe in zip(tabs, recipe_outputs):
+                    with tab:
+                        st.markdown(recipe)
         st.markdown("---")
 
 if __name__ == "__main__":
@@ -2,16 +2,23 @@
 
 import os
 import sys
-from typing import List
+import json
+import asyncio
+import hashlib
+import functools
+from typing import Callable, Sequence, Tuple
 from pathlib import Path
 
 # 引入函式庫
 try:
+    import httpx
+    import diskcache
     from google import genai
+    from google.genai import types
     from dotenv import load_dotenv
 except ImportError:
-    print("❌ 錯誤：請確保已安裝 google-genai 和 python-dotenv。")
-    print("請運行: pip install google-genai python-dotenv")
+    print("❌ 錯誤：請確保已安裝 google-genai、httpx、diskcache 和 python-dotenv。")
+    print("請運行: pip install google-genai httpx diskcache python-dotenv")
     sys.exit(1)
 
 # =================================================================
@@ -28,28 +35,39 @@ API_KEY = os.getenv("GEMINI_API_KEY")
 if not API_KEY:
     raise ValueError("❌ 錯誤：GEMINI_API_KEY 未設定。請檢查您的 .env 檔案並確保格式正確。")
 
+# 共用的 HTTP 連線池：所有非同步呼叫重複使用同一組 TCP/TLS 連線，避免每次重新握手
+HTTP_OPTIONS = types.HttpOptions(
+    async_client_args={
+        "limits": httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    }
+)
+
 try:
-    # 初始化 Gemini 客戶端
-    client = genai.Client(api_key=API_KEY)
+    # 初始化 Gemini 客戶端 (透過 client.aio 使用非同步介面)
+    client = genai.Client(api_key=API_KEY, http_options=HTTP_OPTIONS)
 except Exception as e:
     print(f"❌ 初始化 Gemini 客戶端失敗，程式將無法運行。錯誤：{e}")
     sys.exit(1)
 
+# 常駐的事件迴圈：連線池中的連線綁定在建立它們的事件迴圈上，
+# 若每次呼叫都 asyncio.run (用完即關閉迴圈)，第二次呼叫就會出現 "Event loop is closed"
+_EVENT_LOOP = asyncio.new_event_loop()
 
-# =================================================================
-# 2. AI 核心邏輯函式
-# =================================================================
-
-def create_recipe_prompt(ingredients: List[str], preference: str) -> str:
+def run_async(coro):
     """
-    根據食材清單和個人偏好，生成給 LLM 的提示詞。
+    在共用的事件迴圈上執行協程並回傳結果。
     """
-    ingredients_str = ", ".join(ingredients)
+    return _EVENT_LOOP.run_until_complete(coro)
+
+# 模型與生成參數 (同時作為快取 key 的一部分)
+RECIPE_MODEL = "gemini-2.5-flash"
+RECIPE_TEMPERATURE = 0.7 # 調整創意程度
 
-    prompt = f"""
+# 食譜提示詞模板只在載入時建立一次，每次呼叫只需代入食材與偏好
+_RECIPE_TEMPLATE = """
     你是一位專業的食譜設計師和營養師。
     
-    請根據我提供的現有食材清單：【{ingredients_str}】，以及我的飲食偏好：【{preference}】，為我設計一個完整的食譜。
+    請根據我提供的現有食材清單：【{ingredients}】，以及我的飲食偏好：【{preference}】，為我設計一個完整的食譜。
 
     請輸出一個清晰、結構化的食譜，包含以下欄位：
     1. 食譜名稱 (創意且吸引人)
@@ -60,38 +78,100 @@ def create_recipe_prompt(ingredients: List[str], preference: str) -> str:
     
     請確保食譜內容健康且易於執行。
     """
-    return prompt
 
-def generate_recipe_from_ai(ingredients_text: str, preference_text: str) -> str:
+# 食材清單為空時的提示訊息 (不會送出任何 AI 請求)
+_EMPTY_MSG = "🚨 請輸入至少一項食材！"
+
+# AI 呼叫失敗時顯示的訊息
+_AI_ERROR_MSG = "❌ 呼叫 AI 失敗。請檢查您的 API Key 或網路連線。錯誤：{error}"
+
+# 持久化的 LLM 回應快取：與 app.py 共用同一個目錄
+LLM_CACHE_DIR = Path(__file__).parent / '.llm_cache'
+llm_cache = diskcache.Cache(str(LLM_CACHE_DIR))
+
+
+# =================================================================
+# 2. AI 核心邏輯函式
+# =================================================================
+
+def normalize_ingredients(ingredients_text: str) -> Tuple[str, ...]:
     """
-    處理使用者輸入，呼叫 Gemini API 生成食譜。
+    將食材字串正規化 (去空白、小寫、去重、排序)，讓順序或大小寫不同的輸入共用快取。
+    """
+    return tuple(sorted({i.strip().lower() for i in ingredients_text.split(',') if i.strip()}))
+
+def disk_cached(make_key: Callable[..., dict]):
+    """
+    以請求內容的 SHA-256 為 key，將非同步 LLM 呼叫的結果存入磁碟快取。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key_payload = json.dumps(make_key(*args, **kwargs), sort_keys=True, ensure_ascii=False)
+            key = hashlib.sha256(key_payload.encode("utf-8")).hexdigest()
+
+            cached = llm_cache.get(key)
+            if cached is not None:
+                return cached
+
+            result = await func(*args, **kwargs)
+            # 只快取成功的回應，失敗時 func 會直接拋出例外，不會寫入快取
+            if result and not result.startswith(("❌", "🚨")):
+                llm_cache.set(key, result)
+            return result
+        return wrapper
+    return decorator
+
+def create_recipe_prompt(ingredients: Sequence[str], preference: str) -> str:
+    """
+    根據食材清單和個人偏好，生成給 LLM 的提示詞。
+    """
+    return _RECIPE_TEMPLATE.format_map({"ingredients": ", ".join(ingredients), "preference": preference})
+
+def _recipe_cache_key(prompt: str) -> dict:
+    return {"model": RECIPE_MODEL, "prompt": prompt, "temperature": RECIPE_TEMPERATURE}
+
+@disk_cached(_recipe_cache_key)
+async def _request_recipe_async(prompt: str) -> str:
+    """
+    送出食譜提示詞並回傳 Gemini API 的完整回應。
+    失敗時直接拋出例外，錯誤訊息由呼叫端 (generate_recipe_from_ai / main) 負責格式化。
+    """
+    response = await client.aio.models.generate_content(
+        model=RECIPE_MODEL,
+        contents=prompt,
+        config={"temperature": RECIPE_TEMPERATURE}
+    )
+    return response.text
+
+async def generate_recipe_from_ingredients_async(ingredients: Tuple[str, ...], preference_text: str) -> str:
+    """
+    以已正規化的食材清單，非同步呼叫 Gemini API 生成食譜。
     """
-    # 處理食材輸入，移除空白並過濾空值
-    ingredients = [i.strip() for i in ingredients_text.split(',') if i.strip()]
-    
     if not ingredients:
-        return "🚨 請輸入至少一項食材！"
+        return _EMPTY_MSG
     
-    final_prompt = create_recipe_prompt(ingredients, preference_text)
-    model_name = "gemini-2.5-flash"
+    final_prompt = create_recipe_prompt(ingredients, preference_text.strip())
+    return await _request_recipe_async(final_prompt)
 
+def generate_recipe_from_ai(ingredients_text: str, preference_text: str) -> str:
+    """
+    同步包裝：保留原本的呼叫方式，內部在共用事件迴圈上執行非同步版本。
+    """
+    # 食材只正規化一次，同時用於快取 key 與提示詞；為空時直接回傳，不必進入事件迴圈
+    ingredients = normalize_ingredients(ingredients_text)
+    if not ingredients:
+        return _EMPTY_MSG
     try:
-        # 執行 API 呼叫
-        response = client.models.generate_content(
-            model=model_name,
-            contents=final_prompt,
-            config={"temperature": 0.7} # 調整創意程度
-        )
-        return response.text
-    
+        return run_async(generate_recipe_from_ingredients_async(ingredients, preference_text))
     except Exception as e:
-        return f"\n❌ 呼叫 AI 失敗。請檢查您的 API Key 或網路連線。錯誤：{e}"
+        return _AI_ERROR_MSG.format(error=e)
 
 # =================================================================
 # 3. 命令列互動介面 (CLI)
 # =================================================================
 
-def main():
+async def main():
     """
     主函式，處理使用者輸入和輸出。
     """
@@ -105,14 +185,20 @@ def main():
     # 接收偏好輸入
     preference_input = input("請輸入您的飲食偏好或客製化要求 (例如：低碳水、少油): ").strip()
     
-    if not ingredients_input:
+    # 只有空白或逗號的輸入也視為空清單，在送出任何請求前就擋下
+    ingredients = normalize_ingredients(ingredients_input)
+    if not ingredients:
         print("\n❌ 輸入無效：食材清單不能為空。")
         return
 
     print("\n🔄 正在生成並客製化食譜中，請稍候...")
     
     # 呼叫核心邏輯
-    recipe_output = generate_recipe_from_ai(ingredients_input, preference_input)
+    try:
+        recipe_output = await generate_recipe_from_ingredients_async(ingredients, preference_input)
+    except Exception as e:
+        print("\n" + _AI_ERROR_MSG.format(error=e))
+        return
     
     # 輸出結果
     print("\n" + "="*45)
@@ -122,4 +208,4 @@ def main():
     print("="*45)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_async(main())
\ No newline at end of file